@@ -8,8 +8,65 @@ from datetime import datetime
 import time
 import atexit
 import sys
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+VIDEO_EXTS = {'.mp4', '.avi', '.mkv', '.mov'}
+AUDIO_EXTS = {'.m4a', '.wav', '.mp3', '.ogg', '.opus'}
+
+# Модель Whisper, используемая по умолчанию
+DEFAULT_MODEL = "large-v3"
+
+# Пресеты декодирования: скорость против точности.
+# Пороги у всех одинаковые (значения Whisper по умолчанию); различаются
+# лучевой поиск, лестница температур и учёт предыдущего текста.
+# balanced совпадает с параметрами model.transcribe по умолчанию
+DECODE_PRESETS = {
+    'fast': {
+        'beam_size': None,
+        'best_of': None,
+        'temperature': (0.0,),
+        # Пороги оставлены: logprob_threshold ещё и защищает уверенную речь от отсева как тишины
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+        'condition_on_previous_text': False,
+    },
+    'balanced': {
+        'beam_size': None,
+        'best_of': None,
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+        'condition_on_previous_text': True,
+    },
+    'accurate': {
+        'beam_size': 5,
+        'best_of': 5,
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'compression_ratio_threshold': 2.4,
+        'logprob_threshold': -1.0,
+        'no_speech_threshold': 0.6,
+        'condition_on_previous_text': True,
+    },
+}
+DEFAULT_PRESET = 'balanced'
+
+# Журнал заданий с замерами скорости (JSON Lines в папке output)
+JOBS_LOG_FILE = "jobs.jsonl"
+
+# Файл кэша метаданных ffprobe (лежит в корне проекта)
+MEDIA_CACHE_FILE = ".media_cache.json"
+
+# Файлы не длиннее порога (сек) транскрибируются пакетно, окнами по 30 секунд
+BATCH_MAX_DURATION = 60.0
+# Грубая оценка видеопамяти на одно окно в пакете и верхняя граница размера пакета
+BATCH_ITEM_MEMORY = 512 * 1024**2
+BATCH_MAX_SIZE = 32
+
 class TranscriptionCancelled(Exception):
     """Custom exception to signal transcription cancellation."""
     pass
@@ -39,6 +96,15 @@ class AudioProcessorGUI:
         self.active_processes = []
         self.current_thread: Optional[threading.Thread] = None
         self.stop_event = threading.Event()
+        self.whisper_available = False
+        self.preload_thread: Optional[threading.Thread] = None
+        self.unload_pending = False
+        
+        # Кэш метаданных медиафайлов (длительность, кодеки), сохраняется между сессиями
+        self.media_cache = MediaMetadataCache(self.base_dir / MEDIA_CACHE_FILE)
+        self.probe_lock = threading.Lock()
+        self.probe_thread: Optional[threading.Thread] = None
+        self.pending_probe = None
         
         # Регистрируем обработчики закрытия
         self.register_cleanup_handlers()
@@ -124,14 +190,17 @@ class AudioProcessorGUI:
         files_frame = ttk.Frame(main_frame)
         files_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
-        self.files_tree = ttk.Treeview(files_frame, columns=('type', 'size'), show='tree headings', height=10)
+        self.files_tree = ttk.Treeview(files_frame, columns=('type', 'size', 'duration'), show='tree headings',
+                                       height=10, selectmode='extended')
         self.files_tree.heading('#0', text='Файл')
         self.files_tree.heading('type', text='Тип')
         self.files_tree.heading('size', text='Размер')
+        self.files_tree.heading('duration', text='Длительность')
         
         self.files_tree.column('#0', width=400)
         self.files_tree.column('type', width=100)
         self.files_tree.column('size', width=100)
+        self.files_tree.column('duration', width=100)
         
         scrollbar = ttk.Scrollbar(files_frame, orient=tk.VERTICAL, command=self.files_tree.yview)
         self.files_tree.configure(yscrollcommand=scrollbar.set)
@@ -158,6 +227,24 @@ class AudioProcessorGUI:
         ttk.Button(actions_frame, text="⏹ Остановить", 
                   command=self.stop_all_processes, width=12).grid(row=0, column=3, padx=(5, 0))
         
+        self.batch_mode_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(actions_frame, text=f"Пакетная обработка коротких файлов (до {BATCH_MAX_DURATION:.0f}с)",
+                       variable=self.batch_mode_var).grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        self.preload_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(actions_frame, text=f"Предзагружать модель {DEFAULT_MODEL} при запуске",
+                       variable=self.preload_var, command=self.toggle_model_preload).grid(row=2, column=0, columnspan=4, sticky=tk.W)
+        
+        decode_frame = ttk.Frame(actions_frame)
+        decode_frame.grid(row=3, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        ttk.Label(decode_frame, text="Режим:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.preset_var = tk.StringVar(value=DEFAULT_PRESET)
+        ttk.Combobox(decode_frame, textvariable=self.preset_var, values=list(DECODE_PRESETS),
+                     state="readonly", width=10).grid(row=0, column=1, sticky=tk.W, padx=(0, 20))
+        ttk.Label(decode_frame, text="Язык:").grid(row=0, column=2, sticky=tk.W, padx=(0, 5))
+        self.language_var = tk.StringVar(value="auto")
+        ttk.Combobox(decode_frame, textvariable=self.language_var,
+                     values=["auto", "ru", "en", "uk", "de", "fr", "es"], state="readonly", width=8).grid(row=0, column=3, sticky=tk.W)
+        
         actions_frame.columnconfigure(4, weight=1)
         
         # Прогресс-бар
@@ -254,10 +341,11 @@ class AudioProcessorGUI:
                 import whisper
                 self.log("✅ Whisper установлен")
                 available_models = whisper.available_models()
-                if 'large-v3' in available_models:
-                    self.log("🎯 Модель large-v3 доступна")
+                if DEFAULT_MODEL in available_models:
+                    self.log(f"🎯 Модель {DEFAULT_MODEL} доступна")
+                    self.whisper_available = True
                 else:
-                    self.log("⚠️ Модель large-v3 не найдена")
+                    self.log(f"⚠️ Модель {DEFAULT_MODEL} не найдена")
             except ImportError:
                 self.log("❌ Whisper не установлен")
             except Exception as e:
@@ -269,6 +357,71 @@ class AudioProcessorGUI:
             
         except Exception as e:
             self.log(f"Ошибка проверки системы: {e}")
+            
+        # Модель грузим заранее, пока пользователь выбирает файлы
+        if self.whisper_available and self.preload_var.get():
+            self.start_model_preload()
+            
+    def toggle_model_preload(self):
+        """Включение предзагрузки или выгрузка модели из памяти"""
+        if self.preload_var.get():
+            self.start_model_preload()
+        else:
+            self.release_model()
+            
+    def release_model(self):
+        """Выгрузка модели; во время задачи откладывается до её завершения"""
+        if self.preload_var.get():
+            # Галочку вернули, пока ждали конца задачи
+            self.unload_pending = False
+            return
+        if self.current_thread and self.current_thread.is_alive():
+            # Задача держит ссылку на модель: выгрузка сейчас не освободит память,
+            # а повторная предзагрузка загрузила бы вторую копию
+            if not self.unload_pending:
+                self.unload_pending = True
+                self.log(f"⏳ Модель {DEFAULT_MODEL} будет выгружена после завершения задачи")
+            self.root.after(1000, self.release_model)
+            return
+        self.unload_pending = False
+        if unload_model(DEFAULT_MODEL):
+            self.log(f"🧹 Модель {DEFAULT_MODEL} выгружена из памяти")
+            self.set_idle_status("Готов к работе")
+            
+    def start_model_preload(self):
+        """Запуск фоновой загрузки модели"""
+        if not (self.whisper_available and self.preload_var.get()):
+            return
+        if is_model_loaded(DEFAULT_MODEL):
+            return
+        if self.preload_thread and self.preload_thread.is_alive():
+            return
+        self.preload_thread = threading.Thread(target=self.preload_model, daemon=True)
+        self.preload_thread.start()
+        
+    def preload_model(self):
+        """Фоновая загрузка модели, пока пользователь выбирает файлы"""
+        self.log(f"⏳ Предзагрузка модели {DEFAULT_MODEL}...")
+        self.ui(self.set_idle_status, f"Загрузка модели {DEFAULT_MODEL}...")
+        start = time.time()
+        try:
+            load_model_cached(DEFAULT_MODEL)
+        except Exception as e:
+            self.log(f"❌ Ошибка предзагрузки модели: {e}")
+            self.ui(self.set_idle_status, "Готов к работе")
+            return
+        self.log(f"✅ Модель {DEFAULT_MODEL} загружена за {time.time() - start:.1f}с")
+        # Галочку сняли во время загрузки: выгружаем, как только модель не нужна задаче
+        if not self.preload_var.get():
+            self.ui(self.release_model)
+            return
+        self.ui(self.set_idle_status, f"Готов к работе (модель {DEFAULT_MODEL} загружена)")
+        
+    def set_idle_status(self, message):
+        """Обновление строки состояния, только если нет активной задачи"""
+        if self.current_thread and self.current_thread.is_alive():
+            return
+        self.progress_var.set(message)
         
     def change_work_dir(self):
         dir_name = self.work_dir_var.get()
@@ -386,34 +539,76 @@ class AudioProcessorGUI:
         if not self.current_work_dir.exists():
             return
             
-        video_exts = {'.mp4', '.avi', '.mkv', '.mov'}
-        audio_exts = {'.m4a', '.wav', '.mp3', '.ogg', '.opus'}
         text_exts = {'.txt'}
         
         files_with_time = []
         for file_path in self.current_work_dir.iterdir():
             if file_path.is_file():
                 ext = file_path.suffix.lower()
-                if ext in video_exts or ext in audio_exts or ext in text_exts:
+                if ext in VIDEO_EXTS or ext in AUDIO_EXTS or ext in text_exts:
                     mtime = file_path.stat().st_mtime
                     files_with_time.append((file_path, mtime))
         
         files_with_time.sort(key=lambda x: x[1], reverse=True)
         
+        media_items = {}
         for file_path, _ in files_with_time:
             ext = file_path.suffix.lower()
             size = file_path.stat().st_size
             size_str = f"{size // 1024 // 1024} МБ" if size > 1024*1024 else f"{size // 1024} КБ"
             
-            if ext in video_exts:
+            if ext in VIDEO_EXTS:
                 file_type = "📹 Видео"
-            elif ext in audio_exts:
+            elif ext in AUDIO_EXTS:
                 file_type = "🎵 Аудио"
             elif ext in text_exts:
                 file_type = "📄 Текст"
                 
-            self.files_tree.insert('', tk.END, text=file_path.name, 
-                                 values=(file_type, size_str))
+            duration_str = ""
+            if ext in VIDEO_EXTS or ext in AUDIO_EXTS:
+                duration_str = format_duration(self.media_cache.duration(file_path))
+                
+            item = self.files_tree.insert('', tk.END, text=file_path.name, 
+                                        values=(file_type, size_str, duration_str))
+            if ext in VIDEO_EXTS or ext in AUDIO_EXTS:
+                media_items[item] = file_path
+        
+        # Метаданные недостающих файлов собираем пакетно в фоне
+        if media_items:
+            self.schedule_probe(media_items)
+            
+    def schedule_probe(self, media_items):
+        """Постановка файлов в очередь фонового ffprobe (не больше одного потока)"""
+        with self.probe_lock:
+            # Более свежий список заменяет ещё не обработанный
+            self.pending_probe = media_items
+            if self.probe_thread is not None:
+                return
+            self.probe_thread = threading.Thread(target=self.probe_files, daemon=True)
+            self.probe_thread.start()
+            
+    def probe_files(self):
+        """Фоновое заполнение кэша метаданных и колонки длительности"""
+        while True:
+            with self.probe_lock:
+                media_items, self.pending_probe = self.pending_probe, None
+                if media_items is None:
+                    self.probe_thread = None
+                    return
+                    
+            try:
+                if not self.media_cache.fill(media_items.values()):
+                    continue
+            except Exception as e:
+                self.log(f"❓ Ошибка получения метаданных: {e}")
+                continue
+                
+            def update_durations(media_items=media_items):
+                for item, file_path in media_items.items():
+                    if self.files_tree.exists(item):
+                        self.files_tree.set(item, 'duration', format_duration(self.media_cache.duration(file_path)))
+                        
+            self.ui(update_durations)
                                      
     def get_selected_file(self):
         selection = self.files_tree.selection()
@@ -422,6 +617,13 @@ class AudioProcessorGUI:
             return None
         return self.files_tree.item(selection[0])['text']
         
+    def get_selected_files(self):
+        selection = self.files_tree.selection()
+        if not selection:
+            messagebox.showwarning("Предупреждение", "Выберите файл из списка")
+            return []
+        return [self.files_tree.item(item)['text'] for item in selection]
+        
     def run_command(self, cmd, cwd=None):
         if cwd is None:
             cwd = self.base_dir
@@ -477,22 +679,48 @@ class AudioProcessorGUI:
         """Безопасное выполнение функций UI из фоновых потоков"""
         self.root.after(0, lambda: fn(*args, **kwargs))
         
-    def run_transcription(self, audio_file: Path):
+    def get_decode_options(self):
+        """Пресет и язык из интерфейса (читать в главном потоке)"""
+        language = self.language_var.get().strip().lower()
+        return {
+            'preset': self.preset_var.get() or DEFAULT_PRESET,
+            'language': None if language in ("", "auto") else language,
+        }
+        
+    def record_job_stats(self, stats):
+        """Запись замеров задания в журнал и лог"""
+        self.log(f"⏱ Режим {stats['preset']}: {format_duration(stats['audio_seconds']) or '0:00'} аудио "
+                 f"за {stats['elapsed']:.1f}с, RTF {stats['rtf']:.3f}")
+        record_job(stats, self.output_dir / JOBS_LOG_FILE)
+        
+    def run_transcription(self, audio_file: Path, batch: Optional["BatchEta"] = None, decode_options=None):
         progress_line = None
         self.progress_bar.config(mode='indeterminate')
         self.progress_bar.start(10)
 
         def on_progress(processed, total, elapsed, remaining):
             nonlocal progress_line
+            file_fraction = processed / total if total and total > 0 else 0.0
             msg = f"Обработано: {processed}"
             if total and total > 0:
                 msg += f" из {total}"
+            if batch is not None:
+                # В пакетном режиме прогресс-бар показывает весь пакет, взвешенный по длительности
+                msg = f"Файл {batch.index + 1} из {batch.count} | " + msg
+                self.ui(self.progress_bar.stop)
+                self.ui(self.progress_bar.config, mode='determinate', maximum=100, value=batch.fraction(file_fraction) * 100)
+            elif total and total > 0:
                 # Обновляем прогресс-бар только если есть total
                 self.ui(self.progress_bar.stop)
-                self.ui(self.progress_bar.config, mode='determinate', maximum=100, value=(processed / total * 100))
+                self.ui(self.progress_bar.config, mode='determinate', maximum=100, value=(file_fraction * 100))
             msg += f" | прошло: {elapsed:.1f}с"
             if remaining is not None and remaining > 0:
                 msg += f" | осталось: {remaining:.1f}с"
+            if batch is not None:
+                batch_remaining = batch.remaining(file_fraction)
+                if batch_remaining is not None and batch_remaining > 0:
+                    msg += f" | до конца пакета: {format_duration(batch_remaining)}"
+                    self.ui(self.progress_var.set, f"Транскрипция пакета... осталось ~{format_duration(batch_remaining)}")
             
             # Безопасное обновление UI через главный поток
             def update_log():
@@ -508,7 +736,50 @@ class AudioProcessorGUI:
             if self.stop_event.is_set():
                 raise TranscriptionCancelled()
 
-        transcribe_file(audio_file, progress_callback=on_progress, stop_event=self.stop_event)
+        if not is_model_loaded(DEFAULT_MODEL):
+            self.log(f"⏳ Загрузка модели {DEFAULT_MODEL}...")
+        stats = transcribe_file(audio_file, progress_callback=on_progress, stop_event=self.stop_event,
+                                **(decode_options or {}))
+        self.record_job_stats(stats)
+        
+    def run_batch_transcription(self, audio_files, decode_options=None, batch: Optional["BatchEta"] = None):
+        """Пакетная транскрипция коротких файлов одним прогоном модели.
+        
+        Короткие файлы должны идти первыми в общем BatchEta выделения.
+        """
+        self.progress_bar.config(mode='indeterminate')
+        self.progress_bar.start(10)
+        
+        def on_progress(processed, total, elapsed, remaining):
+            msg = f"Пакет: {processed} из {total} файлов | прошло: {elapsed:.1f}с"
+            if remaining is not None and remaining > 0:
+                msg += f" | осталось: {format_duration(remaining)}"
+            value = processed / total * 100
+            if batch is not None:
+                batch.set_completed(processed)
+                value = batch.fraction() * 100
+                batch_remaining = batch.remaining()
+                if batch_remaining is not None and batch_remaining > 0:
+                    msg += f" | до конца пакета: {format_duration(batch_remaining)}"
+            self.ui(self.progress_bar.stop)
+            self.ui(self.progress_bar.config, mode='determinate', maximum=100, value=value)
+            self.ui(self.progress_var.set, msg)
+            
+        stats = transcribe_batch(audio_files, progress_callback=on_progress, stop_event=self.stop_event,
+                                 **(decode_options or {}))
+        self.log(f"⚡ Пакет: {stats['files']} файлов ({stats['windows']} окон) за {stats['elapsed']:.1f}с, "
+                 f"{stats['files_per_second']:.2f} файлов/с, размер пакета {stats['batch_size']}")
+        self.record_job_stats(stats)
+        
+    def collect_transcript(self, audio_file: Path):
+        """Перенос готового .txt в папку transcripts"""
+        txt_file = audio_file.with_suffix('.txt')
+        transcript_file = self.transcripts_dir / txt_file.name
+        if txt_file.exists():
+            txt_file.rename(transcript_file)
+            self.log(f"✓ Транскрипция готова: transcripts/{transcript_file.name}")
+        else:
+            self.log(f"✓ Транскрипция готова: {audio_file.stem}.txt")
             
     def extract_audio(self):
         selected_file = self.get_selected_file()
@@ -520,7 +791,7 @@ class AudioProcessorGUI:
             messagebox.showerror("Ошибка", f"Файл не найден в папке input: {selected_file}")
             return
             
-        if input_file.suffix.lower() not in {'.mp4', '.avi', '.mkv', '.mov'}:
+        if input_file.suffix.lower() not in VIDEO_EXTS:
             messagebox.showerror("Ошибка", "Выберите видеофайл")
             return
             
@@ -543,33 +814,63 @@ class AudioProcessorGUI:
         threading.Thread(target=extract, daemon=True).start()
         
     def transcribe_audio(self):
-        selected_file = self.get_selected_file()
-        if not selected_file:
-            return
-            
-        audio_file = self.audio_dir / selected_file
-        if not audio_file.exists():
-            messagebox.showerror("Ошибка", f"Файл не найден в папке audio: {selected_file}")
+        selected_files = self.get_selected_files()
+        if not selected_files:
             return
             
-        if audio_file.suffix.lower() not in {'.m4a', '.wav', '.mp3', '.ogg', '.opus'}:
-            messagebox.showerror("Ошибка", "Выберите аудиофайл")
-            return
+        audio_files = []
+        for selected_file in selected_files:
+            audio_file = self.audio_dir / selected_file
+            if not audio_file.exists():
+                messagebox.showerror("Ошибка", f"Файл не найден в папке audio: {selected_file}")
+                return
+                
+            if audio_file.suffix.lower() not in AUDIO_EXTS:
+                messagebox.showerror("Ошибка", "Выберите аудиофайл")
+                return
+            audio_files.append(audio_file)
             
-        self.log(f"Транскрибируем: {selected_file}")
+        if len(audio_files) == 1:
+            self.log(f"Транскрибируем: {audio_files[0].name}")
+        else:
+            self.log(f"Транскрибируем пакет из {len(audio_files)} файлов (сначала самые длинные)")
         self.start_progress("Транскрипция аудио...")
         self.stop_event.clear()
+        decode_options = self.get_decode_options()
+        batch_mode = self.batch_mode_var.get()
 
         def worker():
             try:
-                self.run_transcription(audio_file)
-                txt_file = audio_file.with_suffix('.txt')
-                transcript_file = self.transcripts_dir / txt_file.name
-                if txt_file.exists():
-                    txt_file.rename(transcript_file)
-                    self.log(f"✓ Транскрипция готова: transcripts/{transcript_file.name}")
-                else:
-                    self.log(f"✓ Транскрипция готова: {audio_file.stem}.txt")
+                batch = None
+                ordered = audio_files
+                if len(audio_files) > 1:
+                    self.media_cache.fill(audio_files)
+                    ordered = order_by_duration(audio_files, self.media_cache)
+                    
+                    short_files = []
+                    if batch_mode:
+                        short_files, ordered = split_short_files(ordered, self.media_cache)
+                        
+                    # Общая оценка на всё выделение: короткие файлы идут первыми
+                    batch = BatchEta([self.media_cache.duration(f) for f in short_files + ordered])
+                    if short_files:
+                        self.log(f"⚡ Пакетная транскрипция {len(short_files)} коротких файлов...")
+                        self.run_batch_transcription(short_files, decode_options, batch)
+                        for audio_file in short_files:
+                            self.collect_transcript(audio_file)
+                        batch.set_completed(len(short_files))
+                    
+                for audio_file in ordered:
+                    if batch is not None:
+                        duration = format_duration(self.media_cache.duration(audio_file)) or "?"
+                        self.log(f"[{batch.index + 1}/{batch.count}] {audio_file.name} ({duration})")
+                    self.run_transcription(audio_file, batch, decode_options)
+                    self.collect_transcript(audio_file)
+                    if batch is not None:
+                        batch.next_file()
+                        
+                if batch is not None:
+                    self.log(f"✓ Пакет обработан за {format_duration(batch.elapsed())}")
                 self.refresh_files()
                 self.stop_progress("Транскрипция завершена")
             except TranscriptionCancelled:
@@ -592,7 +893,7 @@ class AudioProcessorGUI:
             messagebox.showerror("Ошибка", f"Файл не найден в папке input: {selected_file}")
             return
             
-        if input_file.suffix.lower() not in {'.mp4', '.avi', '.mkv', '.mov'}:
+        if input_file.suffix.lower() not in VIDEO_EXTS:
             messagebox.showerror("Ошибка", "Выберите видеофайл для полного цикла")
             return
             
@@ -601,6 +902,7 @@ class AudioProcessorGUI:
         self.log(f"=== ПОЛНЫЙ ЦИКЛ для: {selected_file} ===")
         self.start_progress("Полный цикл обработки...")
         self.stop_event.clear()
+        decode_options = self.get_decode_options()
 
         def worker():
             self.log("Шаг 1: Извлечение аудио...")
@@ -620,7 +922,7 @@ class AudioProcessorGUI:
             self.log("Шаг 2: Транскрипция...")
             self.start_progress("Транскрипция аудио...")
             try:
-                self.run_transcription(audio_file)
+                self.run_transcription(audio_file, decode_options=decode_options)
                 txt_file = audio_file.with_suffix('.txt')
                 transcript_file = self.transcripts_dir / txt_file.name
                 if txt_file.exists():
@@ -640,8 +942,321 @@ class AudioProcessorGUI:
         self.current_thread.start()
 
 
-def transcribe_file(audio_path: Path, model_name: str = "large-v3", progress_callback=None, stop_event: Optional[threading.Event] = None):
-    """Transcribe the given audio file and save a `.txt` alongside it."""
+def probe_media(path: Path) -> Optional[dict]:
+    """Return duration, codecs and audio stream count of a media file via ffprobe.
+
+    Returns ``None`` if ffprobe ran but could not read the file. Raises ``OSError``
+    if ffprobe cannot be started and ``subprocess.TimeoutExpired`` if it hangs:
+    those failures say nothing about the file itself.
+    """
+    cmd = ['ffprobe', '-v', 'error', '-show_entries',
+           'format=duration:stream=codec_type,codec_name', '-of', 'json', str(path)]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30,
+                            encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        return None
+    try:
+        data = json.loads(result.stdout or '{}')
+    except ValueError:
+        return None
+
+    streams = data.get('streams', [])
+    audio_codecs = [s.get('codec_name', '') for s in streams if s.get('codec_type') == 'audio']
+    video_codecs = [s.get('codec_name', '') for s in streams if s.get('codec_type') == 'video']
+    try:
+        duration = float(data.get('format', {}).get('duration') or 0.0)
+    except ValueError:
+        duration = 0.0
+    return {
+        'duration': duration,
+        'audio_codecs': audio_codecs,
+        'video_codecs': video_codecs,
+        'audio_streams': len(audio_codecs),
+    }
+
+
+class MediaMetadataCache:
+    """ffprobe metadata persisted to a JSON file, invalidated by file size and mtime."""
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}
+        with self._lock:
+            self._entries = entries if isinstance(entries, dict) else {}
+
+    def save(self):
+        # Записи сериализуются, у каждой свой временный файл
+        with self._save_lock:
+            with self._lock:
+                entries = dict(self._entries)
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_path.parent,
+                                                 prefix=self.cache_path.name, suffix='.tmp',
+                                                 delete=False) as f:
+                    tmp_path = f.name
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                print(f"Ошибка сохранения кэша метаданных: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _stamp(path: Path):
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime]
+
+    def _entry(self, path: Path) -> Optional[dict]:
+        """Cache entry if it is still valid for the file on disk."""
+        with self._lock:
+            entry = self._entries.get(str(path.resolve()))
+        if not entry:
+            return None
+        try:
+            if entry.get('stamp') != self._stamp(path):
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def get(self, path) -> Optional[dict]:
+        """Cached metadata, or ``None`` if the file is not probed yet or ffprobe failed on it."""
+        entry = self._entry(Path(path))
+        return entry.get('meta') if entry else None
+
+    def duration(self, path) -> float:
+        meta = self.get(path)
+        return meta.get('duration', 0.0) if meta else 0.0
+
+    def fill(self, paths, max_workers: int = 4) -> int:
+        """Probe every path missing from the cache in parallel and persist the result.
+
+        Files ffprobe could not read are cached too (as ``meta: None``), so they are
+        not re-probed until their size or mtime changes. A missing ffprobe or a
+        timeout is not cached: those files are probed again next time.
+        Returns the number of newly probed files.
+        """
+        missing = [Path(p) for p in paths if self._entry(Path(p)) is None]
+        if not missing:
+            return 0
+
+        probed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [(path, pool.submit(probe_media, path)) for path in missing]
+            for path, future in futures:
+                try:
+                    meta = future.result()
+                except (OSError, subprocess.TimeoutExpired):
+                    continue
+                try:
+                    stamp = self._stamp(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    self._entries[str(path.resolve())] = {'stamp': stamp, 'meta': meta}
+                probed += 1
+
+        if probed:
+            self.save()
+        return probed
+
+
+def order_by_duration(paths, cache: MediaMetadataCache):
+    """Longest files first; files with unknown duration go last."""
+    return sorted(paths, key=cache.duration, reverse=True)
+
+
+class BatchEta:
+    """Whole-batch progress and ETA weighted by media duration."""
+
+    def __init__(self, durations):
+        durations = list(durations)
+        known = [d for d in durations if d > 0]
+        # Файлы с неизвестной длительностью считаем средними
+        fallback = sum(known) / len(known) if known else 1.0
+        self.durations = [d if d > 0 else fallback for d in durations]
+        self.total = sum(self.durations)
+        self.count = len(self.durations)
+        self.index = 0
+        self.done = 0.0
+        self.start_time = time.time()
+
+    def next_file(self):
+        if self.index < self.count:
+            self.done += self.durations[self.index]
+            self.index += 1
+
+    def set_completed(self, count: int):
+        """Mark the first ``count`` files as done (for passes that finish several at once)."""
+        self.index = min(max(count, 0), self.count)
+        self.done = sum(self.durations[:self.index])
+
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    def fraction(self, file_fraction: float = 0.0) -> float:
+        if self.total <= 0:
+            return 0.0
+        current = self.durations[self.index] if self.index < self.count else 0.0
+        return min(1.0, (self.done + file_fraction * current) / self.total)
+
+    def remaining(self, file_fraction: float = 0.0) -> Optional[float]:
+        fraction = self.fraction(file_fraction)
+        if fraction <= 0:
+            return None
+        return self.elapsed() / fraction * (1 - fraction)
+
+
+def split_short_files(paths, cache: MediaMetadataCache):
+    """Split paths into (short, rest): short files are worth cross-file batching."""
+    short, rest = [], []
+    for path in paths:
+        duration = cache.duration(path)
+        (short if 0 < duration <= BATCH_MAX_DURATION else rest).append(path)
+    # Пакет из одного файла не имеет смысла
+    if len(short) < 2:
+        return [], list(paths)
+    return short, rest
+
+
+def format_duration(seconds: float) -> str:
+    if not seconds or seconds <= 0:
+        return ""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def collect_media_files(paths):
+    """Expand directories into the audio/video files they contain."""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir()
+                                if p.is_file() and p.suffix.lower() in AUDIO_EXTS | VIDEO_EXTS))
+        else:
+            files.append(path)
+    return files
+
+
+_loaded_models = {}
+# Событие на каждую загружаемую сейчас модель
+_loading_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model_cached(model_name: str = DEFAULT_MODEL, stop_event: Optional[threading.Event] = None):
+    """Load a Whisper model once per process; concurrent callers wait for the same load.
+
+    A caller waiting for another thread's load raises ``TranscriptionCancelled``
+    as soon as ``stop_event`` is set.
+    """
+    while True:
+        with _models_lock:
+            model = _loaded_models.get(model_name)
+            if model is not None:
+                return model
+            loading = _loading_models.get(model_name)
+            owner = loading is None
+            if owner:
+                loading = threading.Event()
+                _loading_models[model_name] = loading
+
+        if owner:
+            try:
+                import whisper
+                model = whisper.load_model(model_name)
+                with _models_lock:
+                    _loaded_models[model_name] = model
+                return model
+            finally:
+                with _models_lock:
+                    _loading_models.pop(model_name, None)
+                loading.set()
+
+        # Ждём чужую загрузку; если она не удалась, следующий проход загрузит сам
+        while not loading.wait(0.2):
+            if stop_event and stop_event.is_set():
+                raise TranscriptionCancelled()
+
+
+def unload_model(model_name: str = DEFAULT_MODEL) -> bool:
+    """Drop a cached model and release cached GPU memory; returns whether it was loaded."""
+    with _models_lock:
+        model = _loaded_models.pop(model_name, None)
+    if model is None:
+        return False
+    del model
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+    return True
+
+
+def is_model_loaded(model_name: str = DEFAULT_MODEL) -> bool:
+    return model_name in _loaded_models
+
+
+def record_job(stats: dict, jobs_path: Path):
+    """Append job stats (preset, durations, real-time factor) as a JSON line."""
+    entry = {'time': datetime.now().isoformat(timespec='seconds'), **stats}
+    try:
+        jobs_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(jobs_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Ошибка записи журнала заданий: {e}")
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """Return Whisper's code for a language code or name; ``None``/"auto" means detect.
+
+    Raises ``ValueError`` for languages Whisper does not know.
+    """
+    if language is None:
+        return None
+    language = language.strip().lower()
+    if language in ("", "auto"):
+        return None
+    from whisper.tokenizer import LANGUAGES, TO_LANGUAGE_CODE
+    if language in LANGUAGES:
+        return language
+    if language in TO_LANGUAGE_CODE:
+        return TO_LANGUAGE_CODE[language]
+    raise ValueError(f"Неизвестный язык: {language}")
+
+
+def transcribe_file(audio_path: Path, model_name: str = DEFAULT_MODEL, progress_callback=None, stop_event: Optional[threading.Event] = None,
+                    preset: str = DEFAULT_PRESET, language: Optional[str] = None) -> dict:
+    """Transcribe the given audio file and save a `.txt` alongside it.
+
+    ``preset`` selects decoding options from ``DECODE_PRESETS``; a fixed ``language``
+    skips language detection. Returns job stats including the real-time factor.
+    """
+    if preset not in DECODE_PRESETS:
+        raise ValueError(f"Неизвестный пресет: {preset}")
+    # Проверяем язык до загрузки модели и аудио
+    language = normalize_language(language)
     try:
         import whisper
         import tqdm
@@ -685,8 +1300,17 @@ def transcribe_file(audio_path: Path, model_name: str = "large-v3", progress_cal
         tqdm.tqdm = partial(TqdmLogger, progress_callback=progress_callback, stop_event=stop_event)
         tqdm.auto.tqdm = tqdm.tqdm
         try:
-            model = whisper.load_model(model_name)
-            result = model.transcribe(str(audio_path))
+            load_start = time.time()
+            model = load_model_cached(model_name, stop_event)
+            load_seconds = time.time() - load_start
+            if stop_event and stop_event.is_set():
+                raise TranscriptionCancelled()
+            # Замер от готовой модели: чтение аудио и декодирование, как в transcribe_batch
+            job_start = time.time()
+            audio = whisper.load_audio(str(audio_path))
+            result = model.transcribe(audio, language=language, fp16=model.device.type == 'cuda',
+                                      **DECODE_PRESETS[preset])
+            job_elapsed = time.time() - job_start
         finally:
             tqdm.tqdm, tqdm.auto.tqdm = old_tqdm, old_auto
 
@@ -694,6 +1318,17 @@ def transcribe_file(audio_path: Path, model_name: str = "large-v3", progress_cal
         with open(txt_path, 'w', encoding='utf-8') as f:
             f.write(result.get('text', ''))
         print(f"✓ Транскрипция сохранена в {txt_path}")
+
+        audio_seconds = len(audio) / whisper.audio.SAMPLE_RATE
+        return {
+            'file': audio_path.name,
+            'preset': preset,
+            'language': language or result.get('language'),
+            'audio_seconds': audio_seconds,
+            'load_seconds': load_seconds,
+            'elapsed': job_elapsed,
+            'rtf': job_elapsed / audio_seconds if audio_seconds > 0 else 0.0,
+        }
     except TranscriptionCancelled:
         print("⏹ Транскрипция остановлена")
         raise
@@ -703,11 +1338,211 @@ def transcribe_file(audio_path: Path, model_name: str = "large-v3", progress_cal
         raise
 
 
+def positive_int(value: str) -> int:
+    """argparse type for strictly positive integers."""
+    import argparse
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается целое число: {value}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"должно быть больше нуля: {value}")
+    return number
+
+
+def auto_batch_size() -> int:
+    """Pick a decode batch size from free GPU memory; a small fixed batch on CPU."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free_memory, _ = torch.cuda.mem_get_info()
+            return int(max(1, min(BATCH_MAX_SIZE, free_memory // BATCH_ITEM_MEMORY)))
+    except Exception:
+        pass
+    return 4
+
+
+def transcribe_batch(audio_paths, model_name: str = DEFAULT_MODEL, batch_size: Optional[int] = None,
+                     progress_callback=None, stop_event: Optional[threading.Event] = None,
+                     preset: str = DEFAULT_PRESET, language: Optional[str] = None) -> dict:
+    """Transcribe many short files by packing their 30-second windows into shared decode batches.
+
+    Each window is decoded independently (no conditioning on previous text) and the
+    results are joined back into a `.txt` saved alongside every source file.
+    Clips longer than 30 s are cut at fixed 30 s boundaries, so a word spanning a
+    boundary may be split. Windows are dropped with the same no-speech rule as
+    ``model.transcribe``. The preset's beam size and no-speech/logprob thresholds
+    apply here, but batched decoding has no temperature fallback.
+    Returns throughput stats.
+    """
+    if preset not in DECODE_PRESETS:
+        raise ValueError(f"Неизвестный пресет: {preset}")
+    # Ошибка в языке не должна всплыть посреди пакета, когда часть .txt уже записана
+    language = normalize_language(language)
+    import whisper
+    import torch
+    from collections import deque
+
+    audio_paths = [Path(p) for p in audio_paths]
+    load_start = time.time()
+    model = load_model_cached(model_name, stop_event)
+    load_seconds = time.time() - load_start
+    if stop_event and stop_event.is_set():
+        raise TranscriptionCancelled()
+    # Время и скорость считаем от готовой модели, как в transcribe_file
+    start_time = time.time()
+    if batch_size is None:
+        batch_size = auto_batch_size()
+    elif batch_size < 1:
+        raise ValueError(f"Размер пакета должен быть положительным: {batch_size}")
+    options = whisper.DecodingOptions(beam_size=DECODE_PRESETS[preset]['beam_size'], language=language,
+                                      fp16=model.device.type == 'cuda', without_timestamps=True)
+
+    # Окна по файлам: сколько ожидается и какие тексты уже получены
+    expected = {}
+    texts = {}
+    pending = []
+    files_done = 0
+    windows_total = 0
+    audio_seconds = 0.0
+
+    no_speech_threshold = DECODE_PRESETS[preset]['no_speech_threshold']
+    logprob_threshold = DECODE_PRESETS[preset]['logprob_threshold']
+
+    def is_silent(result):
+        # То же правило, что в model.transcribe: уверенно распознанную речь не отбрасываем.
+        # Иначе хвост из паддинга (например, 31-я секунда) даёт выдуманный текст
+        if no_speech_threshold is None or result.no_speech_prob <= no_speech_threshold:
+            return False
+        return logprob_threshold is None or result.avg_logprob <= logprob_threshold
+
+    def decode_windows(items):
+        nonlocal batch_size
+        mels = torch.stack([mel for _, _, mel in items]).to(model.device)
+        try:
+            return whisper.decode(model, mels, options)
+        except RuntimeError as e:
+            # При нехватке видеопамяти уменьшаем пакет и повторяем частями
+            if 'out of memory' not in str(e).lower() or len(items) == 1:
+                raise
+            del mels
+            torch.cuda.empty_cache()
+            step = max(1, len(items) // 2)
+            batch_size = min(batch_size, step)
+            results = []
+            for i in range(0, len(items), step):
+                results.extend(decode_windows(items[i:i + step]))
+            return results
+
+    def flush(items):
+        nonlocal files_done
+        if stop_event and stop_event.is_set():
+            raise TranscriptionCancelled()
+        results = decode_windows(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"Декодировано {len(results)} окон из {len(items)}")
+        for (file_index, window_index, _), result in zip(items, results):
+            texts[file_index][window_index] = "" if is_silent(result) else result.text.strip()
+            if len(texts[file_index]) == expected[file_index]:
+                path = audio_paths[file_index]
+                parts = [texts[file_index][i] for i in range(expected[file_index])]
+                with open(path.with_suffix('.txt'), 'w', encoding='utf-8') as f:
+                    f.write(" ".join(p for p in parts if p))
+                del texts[file_index]
+                files_done += 1
+        if progress_callback:
+            elapsed = time.time() - start_time
+            rate = files_done / elapsed if elapsed > 0 else 0
+            remaining = (len(audio_paths) - files_done) / rate if rate > 0 else None
+            progress_callback(files_done, len(audio_paths), elapsed, remaining)
+
+    try:
+        # Декодирование аудио через ffmpeg идёт в фоне, с ограниченным опережением
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            queue = deque()
+            next_index = 0
+            while next_index < len(audio_paths) or queue:
+                while next_index < len(audio_paths) and len(queue) < batch_size * 2:
+                    queue.append((next_index, pool.submit(whisper.load_audio, str(audio_paths[next_index]))))
+                    next_index += 1
+                file_index, future = queue.popleft()
+                audio = future.result()
+                audio_seconds += len(audio) / whisper.audio.SAMPLE_RATE
+                offsets = range(0, max(len(audio), 1), whisper.audio.N_SAMPLES)
+                expected[file_index] = len(offsets)
+                texts[file_index] = {}
+                for window_index, offset in enumerate(offsets):
+                    chunk = whisper.pad_or_trim(audio[offset:offset + whisper.audio.N_SAMPLES])
+                    mel = whisper.log_mel_spectrogram(chunk, n_mels=model.dims.n_mels)
+                    pending.append((file_index, window_index, mel))
+                    windows_total += 1
+                    if len(pending) >= batch_size:
+                        flush(pending[:batch_size])
+                        pending = pending[batch_size:]
+            while pending:
+                flush(pending[:batch_size])
+                pending = pending[batch_size:]
+    except TranscriptionCancelled:
+        print("⏹ Пакетная транскрипция остановлена")
+        raise
+    except Exception as e:
+        print(f"❌ Ошибка пакетной транскрипции: {e}")
+        raise
+
+    elapsed = time.time() - start_time
+    stats = {
+        'preset': preset,
+        'language': language,
+        'files': files_done,
+        'windows': windows_total,
+        'audio_seconds': audio_seconds,
+        'load_seconds': load_seconds,
+        'elapsed': elapsed,
+        'files_per_second': files_done / elapsed if elapsed > 0 else 0.0,
+        'batch_size': batch_size,
+        'rtf': elapsed / audio_seconds if audio_seconds > 0 else 0.0,
+    }
+    print(f"✓ Пакет: {files_done} файлов за {elapsed:.1f}с ({stats['files_per_second']:.2f} файлов/с)")
+    return stats
+
+
 if __name__ == "__main__":
     # При наличии аргумента командной строки работаем в режиме CLI
     if len(sys.argv) > 1:
-        audio = Path(sys.argv[1])
-        transcribe_file(audio)
+        import argparse
+        parser = argparse.ArgumentParser(description="Транскрипция аудио через Whisper")
+        parser.add_argument('paths', nargs='+', type=Path, help="аудиофайлы или папки с ними")
+        parser.add_argument('--batch', action='store_true',
+                            help=f"пакетная обработка файлов до {BATCH_MAX_DURATION:.0f}с")
+        parser.add_argument('--batch-size', type=positive_int, default=None,
+                            help="размер пакета (по умолчанию подбирается по свободной памяти)")
+        parser.add_argument('--preset', choices=list(DECODE_PRESETS), default=DEFAULT_PRESET,
+                            help=f"режим декодирования (по умолчанию {DEFAULT_PRESET})")
+        parser.add_argument('--language', default=None,
+                            help="язык аудио, например ru; без него язык определяется автоматически")
+        args = parser.parse_args()
+        try:
+            args.language = normalize_language(args.language)
+        except ValueError as e:
+            parser.error(str(e))
+        jobs_path = Path(__file__).parent.parent / "output" / JOBS_LOG_FILE
+
+        audio_files = collect_media_files(args.paths)
+        cache = MediaMetadataCache(Path(__file__).parent.parent / MEDIA_CACHE_FILE)
+        cache.fill(audio_files)
+        ordered = order_by_duration(audio_files, cache)
+        if args.batch:
+            short_files, ordered = split_short_files(ordered, cache)
+            if short_files:
+                stats = transcribe_batch(short_files, batch_size=args.batch_size,
+                                         preset=args.preset, language=args.language)
+                record_job(stats, jobs_path)
+        for i, audio in enumerate(ordered, 1):
+            if len(ordered) > 1:
+                print(f"[{i}/{len(ordered)}] {audio.name} ({format_duration(cache.duration(audio)) or '?'})")
+            stats = transcribe_file(audio, preset=args.preset, language=args.language)
+            print(f"⏱ Режим {stats['preset']}: RTF {stats['rtf']:.3f}")
+            record_job(stats, jobs_path)
     else:
         try:
             root = tk.Tk()